@@ -3,19 +3,103 @@
 import os
 import json
 import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import pickle
+from urllib.parse import urlsplit, urlunsplit, unquote_plus
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
 
 # Define cache directory
 CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache")
 
+# Query parameters that only track visitors and never change page content
+TRACKING_PARAMS = {
+    'gclid', 'dclid', 'fbclid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid',
+    '_ga', '_gl', 'igshid', 'ref_src', 'spm'
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'hsa_')
+
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
 def ensure_cache_dir():
     """Ensure the cache directory exists."""
-    if not os.path.exists(CACHE_DIR):
-        os.makedirs(CACHE_DIR)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+@contextmanager
+def file_lock(path):
+    """
+    Hold an exclusive lock for a shared file, across threads and processes.
+
+    The lock is taken on a separate `<path>.lock` file so the data file itself
+    can be replaced atomically while the lock is held.
+    """
+    with _file_locks_guard:
+        thread_lock = _file_locks.setdefault(path, threading.Lock())
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(f"{path}.lock", 'a', encoding='utf-8') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def write_atomic(path, data, mode='w'):
+    """Write a file through a unique temporary file so readers never see a partial write."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, mode, encoding=None if 'b' in mode else 'utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def canonicalize_url(url):
+    """
+    Normalize a URL so addresses of the same page map to the same cache entry.
+
+    Only drops tracking parameters and sorts the remaining query parameters.
+    Everything else, including fragments used by client-side routes and
+    parameters without a value, is kept exactly as written.
+
+    Raises:
+        ValueError: if the URL cannot be parsed (e.g. an unclosed IPv6 bracket)
+    """
+    parts = urlsplit(url.strip())
+    params = []
+    for param in parts.query.split("&"):
+        key = unquote_plus(param.split("=", 1)[0]).lower()
+        if param and key not in TRACKING_PARAMS and not key.startswith(TRACKING_PREFIXES):
+            params.append(param)
+    # Stable sort on the name keeps the order of repeated parameters
+    params.sort(key=lambda param: param.split("=", 1)[0])
+    return urlunsplit(parts._replace(query="&".join(params)))
+
+def get_domain(url):
+    """Return the lowercase host name of a URL, or an empty string if it has none."""
+    try:
+        return (urlsplit(url).hostname or "").lower()
+    except ValueError:
+        return ""
 
 def generate_cache_key(url):
-    """Generate a unique cache key based on the URL."""
+    """Generate a unique cache key based on the canonical form of the URL."""
+    try:
+        url = canonicalize_url(url)
+    except ValueError:
+        # Unparseable URLs are keyed as typed
+        pass
     return hashlib.md5(url.encode('utf-8')).hexdigest()
 
 def get_cache_path(cache_key):
@@ -47,8 +131,7 @@ def save_to_cache(url, content, metadata=None, expiry_hours=24):
         'expiry': expiry_time.isoformat()
     }
     
-    with open(cache_path, 'wb') as f:
-        pickle.dump(cache_data, f)
+    write_atomic(cache_path, pickle.dumps(cache_data), 'wb')
     
     # Create an index file for easier browsing
     update_cache_index(url, cache_key, expiry_time)
@@ -83,7 +166,7 @@ def load_from_cache(url):
         
         return cache_data['content'], cache_data['metadata']
     
-    except (json.JSONDecodeError, KeyError, ValueError):
+    except (pickle.UnpicklingError, EOFError, KeyError, ValueError):
         # Cache file is corrupt
         return None, None
 
@@ -92,54 +175,54 @@ def update_cache_index(url, cache_key, expiry_time):
     ensure_cache_dir()
     index_path = os.path.join(CACHE_DIR, "index.json")
     
-    index_data = {}
-    if os.path.exists(index_path):
-        try:
-            with open(index_path, 'r', encoding='utf-8') as f:
-                index_data = json.load(f)
-        except json.JSONDecodeError:
-            index_data = {}
-    
-    index_data[cache_key] = {
-        'url': url,
-        'expiry': expiry_time.isoformat(),
-        'created': datetime.now().isoformat()
-    }
-    
-    with open(index_path, 'w', encoding='utf-8') as f:
-        json.dump(index_data, f, indent=2)
+    with file_lock(index_path):
+        index_data = {}
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    index_data = json.load(f)
+            except json.JSONDecodeError:
+                index_data = {}
+        
+        index_data[cache_key] = {
+            'url': url,
+            'expiry': expiry_time.isoformat(),
+            'created': datetime.now().isoformat()
+        }
+        
+        write_atomic(index_path, json.dumps(index_data, indent=2))
 
 def clean_expired_cache():
     """Remove expired cache entries."""
     ensure_cache_dir()
     index_path = os.path.join(CACHE_DIR, "index.json")
     
-    if not os.path.exists(index_path):
-        return
-    
-    try:
-        with open(index_path, 'r', encoding='utf-8') as f:
-            index_data = json.load(f)
-        
-        current_time = datetime.now()
-        to_remove = []
+    with file_lock(index_path):
+        if not os.path.exists(index_path):
+            return
         
-        for cache_key, info in index_data.items():
-            expiry_time = datetime.fromisoformat(info['expiry'])
-            if current_time > expiry_time:
-                cache_path = get_cache_path(cache_key)
-                if os.path.exists(cache_path):
-                    os.remove(cache_path)
-                to_remove.append(cache_key)
-
-        # Update the index
-        for key in to_remove:
-            del index_data[key]
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index_data = json.load(f)
+            
+            current_time = datetime.now()
+            to_remove = []
+            
+            for cache_key, info in index_data.items():
+                expiry_time = datetime.fromisoformat(info['expiry'])
+                if current_time > expiry_time:
+                    cache_path = get_cache_path(cache_key)
+                    if os.path.exists(cache_path):
+                        os.remove(cache_path)
+                    to_remove.append(cache_key)
+
+            # Update the index
+            for key in to_remove:
+                del index_data[key]
+            
+            write_atomic(index_path, json.dumps(index_data, indent=2))
         
-        with open(index_path, 'w', encoding='utf-8') as f:
-            json.dump(index_data, f, indent=2)
-    
-    except (json.JSONDecodeError, KeyError, ValueError):
-        # If index is corrupt, recreate it
-        if os.path.exists(index_path):
-            os.remove(index_path)
+        except (json.JSONDecodeError, KeyError, ValueError):
+            # If index is corrupt, recreate it
+            if os.path.exists(index_path):
+                os.remove(index_path)
@@ -0,0 +1,541 @@
+"""Module for crawling multiple pages on top of the single-page scraper."""
+
+import os
+import json
+import time
+import heapq
+import base64
+import hashlib
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlsplit, urldefrag
+from urllib.robotparser import RobotFileParser
+
+import requests
+from bs4 import BeautifulSoup
+
+from cache_manager import (
+    CACHE_DIR, canonicalize_url, clean_expired_cache, write_atomic, load_from_cache, get_domain
+)
+from scrape import scrape_website, extract_links, extract_body_content, clean_body_content
+from dedup import register_page
+
+# Directory where crawl frontiers are persisted between runs
+CRAWL_STATE_DIR = os.path.join(CACHE_DIR, "crawls")
+
+CRAWLER_USER_AGENT = "AIWebScraper"
+
+# Above this number of expected URLs the seen-set switches to a Bloom filter
+BLOOM_THRESHOLD = 100000
+
+# The frontier is saved after this many pages or seconds, whichever comes first
+SAVE_EVERY_PAGES = 25
+SAVE_INTERVAL_SECONDS = 30
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter used as a compact seen-set for large crawls."""
+
+    def __init__(self, capacity, error_rate=0.001, bits=None):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.sha256(item.encode('utf-8')).digest()
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:16], "big")
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        """Add an item to the filter."""
+        for pos in self._positions(item):
+            self.bits[pos // 8] |= 1 << (pos % 8)
+
+    def __contains__(self, item):
+        return all(self.bits[pos // 8] & (1 << (pos % 8)) for pos in self._positions(item))
+
+    def to_dict(self, capacity, error_rate):
+        """Serialize the filter to a JSON-compatible dictionary."""
+        return {
+            'type': 'bloom',
+            'capacity': capacity,
+            'error_rate': error_rate,
+            'bits': base64.b64encode(bytes(self.bits)).decode('ascii')
+        }
+
+
+class SeenSet:
+    """Set of already-discovered URLs, exact for small crawls and Bloom-backed for large ones."""
+
+    def __init__(self, capacity=10000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        if capacity > BLOOM_THRESHOLD:
+            self._items = BloomFilter(capacity, error_rate)
+        else:
+            self._items = set()
+
+    def add(self, url):
+        """Mark a URL as seen."""
+        self._items.add(url)
+
+    def __contains__(self, url):
+        return url in self._items
+
+    def to_dict(self):
+        """Serialize the seen-set to a JSON-compatible dictionary."""
+        if isinstance(self._items, BloomFilter):
+            return self._items.to_dict(self.capacity, self.error_rate)
+        return {'type': 'set', 'capacity': self.capacity, 'items': list(self._items)}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a seen-set from its serialized form."""
+        seen = cls(data.get('capacity', 10000), data.get('error_rate', 0.001))
+        if data.get('type') == 'bloom':
+            seen._items = BloomFilter(
+                seen.capacity, seen.error_rate,
+                bits=bytearray(base64.b64decode(data['bits']))
+            )
+        else:
+            seen._items = set(data.get('items', []))
+        return seen
+
+
+class RobotsCache:
+    """Fetch and cache robots.txt rules per host."""
+
+    def __init__(self, user_agent=CRAWLER_USER_AGENT, timeout=10):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self._parsers = {}
+        self._lock = threading.Lock()
+
+    def _get_parser(self, url):
+        parts = urlsplit(url)
+        root = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            if root in self._parsers:
+                return self._parsers[root]
+
+        parser = RobotFileParser(f"{root}/robots.txt")
+        try:
+            response = requests.get(
+                f"{root}/robots.txt",
+                headers={'User-Agent': self.user_agent},
+                timeout=self.timeout
+            )
+            if response.status_code in (401, 403):
+                parser.disallow_all = True
+            elif response.status_code >= 400:
+                parser.allow_all = True
+            else:
+                parser.parse(response.text.splitlines())
+        except requests.RequestException:
+            # Unreachable robots.txt is treated as no restrictions
+            parser.allow_all = True
+
+        with self._lock:
+            self._parsers[root] = parser
+        return parser
+
+    def can_fetch(self, url):
+        """Check whether robots.txt allows fetching the URL."""
+        return self._get_parser(url).can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url):
+        """Return the Crawl-delay declared for the host, if any."""
+        return self._get_parser(url).crawl_delay(self.user_agent)
+
+
+class Frontier:
+    """
+    URLs to crawl with dedup, depth/domain limits and per-domain pacing.
+
+    Each domain has its own priority queue. Domains waiting out their politeness
+    delay sit in a heap keyed on the time they become ready; ready domains sit in
+    a heap keyed on the priority of their best URL, so picking the next URL costs
+    O(log n) instead of scanning the whole frontier.
+
+    A domain has at most one URL in flight, and its delay counts from the moment
+    that fetch is done. With wait_for_robots, a domain seen for the first time is
+    held in pending_robots until set_domain_delay is called with its Crawl-delay.
+    """
+
+    def __init__(self, max_depth=2, allowed_domains=None, max_pages_per_domain=None,
+                 min_delay=1.0, seen_capacity=10000, wait_for_robots=False):
+        self.max_depth = max_depth
+        self.allowed_domains = set(allowed_domains or [])
+        self.max_pages_per_domain = max_pages_per_domain
+        self.min_delay = min_delay
+        self.wait_for_robots = wait_for_robots
+        self.seen = SeenSet(seen_capacity)
+        self.counter = 0
+        self.size = 0
+        self.domain_queues = {}
+        self.domain_counts = {}
+        self.domain_delays = {}
+        self.next_fetch = {}
+        self.waiting = []
+        self.ready = []
+        self.ready_domains = set()
+        self.busy_domains = set()
+        self.pending_robots = {}
+        self.in_flight = {}
+        self.crawled = []
+
+    def add(self, url, depth=0, priority=None):
+        """
+        Add a URL to the frontier if it passes the limits and has not been seen.
+
+        URLs are deduplicated on their canonical form without fragment, but the URL
+        is fetched as it was linked.
+        """
+        url = url.strip()
+        try:
+            key, _ = urldefrag(canonicalize_url(url))
+            scheme = urlsplit(url).scheme.lower()
+        except ValueError:
+            print(f"Skipping invalid URL {url}")
+            return False
+        if scheme not in ("http", "https"):
+            return False
+        if depth > self.max_depth or key in self.seen:
+            return False
+        domain = get_domain(url)
+        if self.allowed_domains and not any(
+            domain == allowed or domain.endswith(f".{allowed}") for allowed in self.allowed_domains
+        ):
+            return False
+        if (self.max_pages_per_domain is not None
+                and self.domain_counts.get(domain, 0) >= self.max_pages_per_domain):
+            return False
+
+        self.seen.add(key)
+        self.domain_counts[domain] = self.domain_counts.get(domain, 0) + 1
+        self._push([depth if priority is None else priority, self.counter, url, depth])
+        self.counter += 1
+        return True
+
+    def _push(self, entry):
+        domain = get_domain(entry[2])
+        queue = self.domain_queues.setdefault(domain, [])
+        was_empty = not queue
+        heapq.heappush(queue, entry)
+        self.size += 1
+
+        if self.wait_for_robots and domain not in self.domain_delays:
+            # Scheduled once set_domain_delay is called
+            self.pending_robots.setdefault(domain, entry[2])
+        elif domain in self.ready_domains:
+            if queue[0] is entry:
+                # New best URL for a ready domain, the older ready entry becomes stale
+                heapq.heappush(self.ready, (entry[0], entry[1], domain))
+        elif was_empty and domain not in self.busy_domains:
+            heapq.heappush(self.waiting, (self.next_fetch.get(domain, 0), domain))
+
+    def set_domain_delay(self, domain, delay):
+        """Set the politeness delay for a domain, never below the global minimum."""
+        self.domain_delays[domain] = max(self.min_delay, delay or 0)
+        if self.pending_robots.pop(domain, None) and self.domain_queues.get(domain):
+            heapq.heappush(self.waiting, (self.next_fetch.get(domain, 0), domain))
+
+    def next_ready(self, now=None):
+        """
+        Pop the highest-priority URL whose domain may be fetched now.
+
+        Returns:
+            tuple: (url, depth, wait_seconds) where url is None when nothing is ready
+                   and wait_seconds is the time until the next domain becomes ready
+        """
+        now = time.time() if now is None else now
+
+        while self.waiting and self.waiting[0][0] <= now:
+            _, domain = heapq.heappop(self.waiting)
+            head = self.domain_queues[domain][0]
+            self.ready_domains.add(domain)
+            heapq.heappush(self.ready, (head[0], head[1], domain))
+
+        while self.ready:
+            priority, counter, domain = heapq.heappop(self.ready)
+            queue = self.domain_queues.get(domain)
+            if domain not in self.ready_domains or not queue or queue[0][:2] != [priority, counter]:
+                continue
+
+            entry = heapq.heappop(queue)
+            self.size -= 1
+            self.ready_domains.discard(domain)
+            # Rescheduled by mark_done
+            self.busy_domains.add(domain)
+            if not queue:
+                del self.domain_queues[domain]
+            self.in_flight[entry[2]] = entry
+            return entry[2], entry[3], 0
+
+        if self.waiting:
+            return None, None, self.waiting[0][0] - now
+        return None, None, None
+
+    def mark_done(self, url, fetched=True, now=None):
+        """
+        Record that a URL has been crawled and let its domain be fetched again.
+
+        The domain delay starts now, unless no request was made (fetched=False).
+        """
+        now = time.time() if now is None else now
+        self.in_flight.pop(url, None)
+        self.crawled.append(url)
+        domain = get_domain(url)
+        self.busy_domains.discard(domain)
+        if fetched:
+            self.next_fetch[domain] = now + self.domain_delays.get(domain, self.min_delay)
+        if self.domain_queues.get(domain) and domain not in self.pending_robots:
+            heapq.heappush(self.waiting, (self.next_fetch.get(domain, 0), domain))
+
+    def __len__(self):
+        return self.size
+
+    def to_dict(self):
+        """Serialize the frontier, requeueing in-flight URLs so they are retried on resume."""
+        queue = [entry for entries in self.domain_queues.values() for entry in entries]
+        return {
+            'max_depth': self.max_depth,
+            'allowed_domains': sorted(self.allowed_domains),
+            'max_pages_per_domain': self.max_pages_per_domain,
+            'min_delay': self.min_delay,
+            'seen': self.seen.to_dict(),
+            'queue': queue + list(self.in_flight.values()),
+            'counter': self.counter,
+            'domain_counts': self.domain_counts,
+            'domain_delays': self.domain_delays,
+            'crawled': self.crawled
+        }
+
+    @classmethod
+    def from_dict(cls, data, wait_for_robots=False):
+        """
+        Rebuild a frontier from its serialized form.
+
+        With wait_for_robots, saved domain delays are dropped so robots.txt is read again.
+        """
+        frontier = cls(
+            max_depth=data['max_depth'],
+            allowed_domains=data.get('allowed_domains'),
+            max_pages_per_domain=data.get('max_pages_per_domain'),
+            min_delay=data.get('min_delay', 1.0),
+            wait_for_robots=wait_for_robots
+        )
+        frontier.seen = SeenSet.from_dict(data['seen'])
+        if not wait_for_robots:
+            frontier.domain_delays = data.get('domain_delays', {})
+        for entry in data.get('queue', []):
+            frontier._push(list(entry))
+        frontier.counter = data.get('counter', frontier.size)
+        frontier.domain_counts = data.get('domain_counts', {})
+        frontier.crawled = data.get('crawled', [])
+        return frontier
+
+
+def get_crawl_state_path(crawl_name):
+    """Get the file path where a crawl frontier is persisted."""
+    if not os.path.exists(CRAWL_STATE_DIR):
+        os.makedirs(CRAWL_STATE_DIR)
+    return os.path.join(CRAWL_STATE_DIR, f"{crawl_name}.json")
+
+
+def save_crawl_state(crawl_name, frontier):
+    """Persist the frontier atomically so a crawl can resume after a restart."""
+    write_atomic(get_crawl_state_path(crawl_name), json.dumps(frontier.to_dict()))
+
+
+def load_crawl_state(crawl_name, wait_for_robots=False):
+    """Load a persisted frontier, or None if there is no usable saved state."""
+    state_path = get_crawl_state_path(crawl_name)
+    if not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return Frontier.from_dict(json.load(f), wait_for_robots)
+    except (json.JSONDecodeError, KeyError, ValueError):
+        # State file is corrupt, start over
+        return None
+
+
+def _fetch_page(url, use_cache, cache_expiry_hours, fetch_page=None):
+    """Scrape a page and extract its outgoing links from the parsed soup."""
+    if fetch_page:
+        html = fetch_page(url)
+    else:
+        html = scrape_website(
+            url, use_cache=use_cache, cache_expiry_hours=cache_expiry_hours, clean_cache=False
+        )
+    soup = BeautifulSoup(html, "html.parser")
+    return html, extract_links(soup, url)
+
+
+def queue_fetcher(job_queue, use_cache=True, cache_expiry_hours=24, timeout=None):
+    """Build a fetch_page callable for crawl() that has workers scrape each page."""
+    def fetch_page(url):
+        return job_queue.run_job('scrape', {
+            'url': url,
+            'use_cache': use_cache,
+            'cache_expiry_hours': cache_expiry_hours,
+            # Cleaned once by crawl() instead
+            'clean_cache': False,
+            'include_html': True
+        }, timeout=timeout)['html']
+    return fetch_page
+
+
+def crawl(seed_urls, max_pages=50, max_depth=2, same_domain=True, max_pages_per_domain=None,
+          min_delay=1.0, max_workers=4, respect_robots=True, crawl_name=None,
+          use_cache=True, cache_expiry_hours=24, priority_fn=None, seen_capacity=10000,
+          on_page=None, fetch_page=None):
+    """
+    Crawl from seed URLs, following links with the existing scraper.
+
+    Args:
+        seed_urls: URLs to start crawling from
+        max_pages: Maximum number of pages fetched in this run
+        max_depth: Maximum link depth from a seed URL
+        same_domain: Restrict the crawl to the domains of the seed URLs
+        max_pages_per_domain: Optional cap on URLs enqueued per domain
+        min_delay: Minimum seconds between two requests to the same domain
+        max_workers: Number of pages scraped concurrently
+        respect_robots: Skip URLs disallowed by robots.txt and honor Crawl-delay
+        crawl_name: If set, the frontier is persisted under this name and an unfinished
+            crawl is resumed; a finished one starts over
+        use_cache: Passed through to scrape_website
+        cache_expiry_hours: Passed through to scrape_website
+        priority_fn: Optional callable (url, depth) -> number, lower is crawled first
+        seen_capacity: Expected number of URLs, above BLOOM_THRESHOLD a Bloom filter is used
+        on_page: Optional callback called with each page dictionary as it is crawled
+        fetch_page: Optional callable url -> html used instead of scrape_website, e.g. to
+            send the fetches to worker processes
+
+    Returns:
+        list: dictionaries with 'url', 'depth', 'html' and 'near_duplicate_of' (URL of a
+              near-identical page seen before, or None) for each page crawled. When resuming,
+              pages crawled in earlier runs that are still cached come first, with depth None.
+    """
+    frontier = load_crawl_state(crawl_name, respect_robots) if crawl_name else None
+    previous_pages = []
+    if frontier is not None and not len(frontier):
+        print(f"Saved crawl '{crawl_name}' already finished, starting a new crawl")
+        frontier = None
+
+    if frontier is not None:
+        print(f"Resuming crawl '{crawl_name}': {len(frontier)} URLs queued, "
+              f"{len(frontier.crawled)} already crawled")
+        for url in frontier.crawled:
+            html, _ = load_from_cache(url)
+            if html:
+                previous_pages.append(
+                    {'url': url, 'depth': None, 'html': html, 'near_duplicate_of': None}
+                )
+    else:
+        allowed = {get_domain(url) for url in seed_urls} if same_domain else None
+        frontier = Frontier(max_depth, allowed, max_pages_per_domain, min_delay, seen_capacity,
+                            wait_for_robots=respect_robots)
+        for url in seed_urls:
+            frontier.add(url, 0, priority_fn(url, 0) if priority_fn else None)
+
+    # Cleaned once here rather than by every scrape running in the pool
+    clean_expired_cache()
+
+    robots = RobotsCache() if respect_robots else None
+    pages = []
+    futures = {}
+    # robots.txt is fetched in its own pool so a slow host never holds up the scheduler
+    robots_futures = {}
+    robots_requested = set()
+    saved_pages, saved_at = 0, time.time()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+                ThreadPoolExecutor(max_workers=max_workers) as robots_executor:
+            while len(frontier) or futures or robots_futures:
+                for domain in frontier.pending_robots.keys() - robots_requested:
+                    future = robots_executor.submit(
+                        robots.crawl_delay, frontier.pending_robots[domain]
+                    )
+                    robots_futures[future] = domain
+                    robots_requested.add(domain)
+
+                wait_time = None
+                while len(futures) < max_workers and len(pages) + len(futures) < max_pages:
+                    url, depth, wait_time = frontier.next_ready()
+                    if url is None:
+                        break
+                    # robots.txt of the domain is already cached at this point
+                    if robots and not robots.can_fetch(url):
+                        print(f"Skipping {url} (disallowed by robots.txt)")
+                        frontier.mark_done(url, fetched=False)
+                        continue
+                    print(f"Crawling {url} (depth {depth})")
+                    future = executor.submit(
+                        _fetch_page, url, use_cache, cache_expiry_hours, fetch_page
+                    )
+                    futures[future] = (url, depth)
+
+                if not futures and (len(pages) >= max_pages
+                                    or (wait_time is None and not robots_futures)):
+                    break
+                if not futures and not robots_futures:
+                    time.sleep(wait_time)
+                    continue
+
+                done, _ = wait(list(futures) + list(robots_futures),
+                               timeout=wait_time or None, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in robots_futures:
+                        domain = robots_futures.pop(future)
+                        try:
+                            delay = future.result()
+                        except Exception as e:  # pylint: disable=broad-except
+                            print(f"Error reading robots.txt for {domain}: {e}")
+                            delay = None
+                        frontier.set_domain_delay(domain, delay)
+                        continue
+
+                    url, depth = futures.pop(future)
+                    try:
+                        html, links = future.result()
+                    except Exception as e:  # pylint: disable=broad-except
+                        print(f"Error crawling {url}: {e}")
+                        frontier.mark_done(url)
+                        continue
+
+                    for link in links:
+                        priority = priority_fn(link, depth + 1) if priority_fn else None
+                        frontier.add(link, depth + 1, priority)
+                    frontier.mark_done(url)
+
+                    page = {
+                        'url': url,
+                        'depth': depth,
+                        'html': html,
+                        'near_duplicate_of': register_page(
+                            url, clean_body_content(extract_body_content(html))
+                        )
+                    }
+                    pages.append(page)
+                    if on_page:
+                        on_page(page)
+
+                if crawl_name and (len(pages) - saved_pages >= SAVE_EVERY_PAGES
+                                   or time.time() - saved_at >= SAVE_INTERVAL_SECONDS):
+                    save_crawl_state(crawl_name, frontier)
+                    saved_pages, saved_at = len(pages), time.time()
+
+                if len(pages) >= max_pages and not futures:
+                    break
+    finally:
+        # Saved on interruption too, so the crawl can resume
+        if crawl_name:
+            save_crawl_state(crawl_name, frontier)
+
+    print(f"Crawl finished: {len(pages)} pages crawled, {len(frontier)} URLs left in frontier")
+    return previous_pages + pages
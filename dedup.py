@@ -0,0 +1,249 @@
+"""Module for detecting near-duplicate pages and repeated chunks to avoid redundant LLM work."""
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+from datetime import datetime
+
+from cache_manager import CACHE_DIR, ensure_cache_dir, canonicalize_url
+
+DEDUP_DB_PATH = os.path.join(CACHE_DIR, "dedup.sqlite3")
+
+SIMHASH_BITS = 64
+
+# Words per shingle used for page fingerprints
+SHINGLE_SIZE = 3
+
+# Pages whose SimHash fingerprints differ by at most this many bits are near-duplicates.
+# Must be lower than the number of bands for the band lookup to find every match.
+NEAR_DUPLICATE_DISTANCE = 3
+SIMHASH_BANDS = 4
+
+# SQLite limits the number of parameters in one statement
+LOOKUP_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS page_bands (
+    band TEXT NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (band, url)
+);
+CREATE TABLE IF NOT EXISTS chunk_results (
+    key TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    expiry REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunk_results_expiry_idx ON chunk_results (expiry);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value
+);
+"""
+
+STAT_COUNTERS = ('pages_seen', 'near_duplicate_pages', 'chunks_seen', 'chunks_deduplicated')
+
+
+@contextmanager
+def _connect():
+    ensure_cache_dir()
+    conn = sqlite3.connect(DEDUP_DB_PATH, timeout=30, isolation_level=None)
+    try:
+        # Run on every connection so a deleted database file is recreated
+        conn.executescript(SCHEMA)
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def _transaction(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _increment(conn, name, amount):
+    conn.execute(
+        "INSERT INTO stats (name, value) VALUES (?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+        (name, amount)
+    )
+
+
+def normalize_text(text):
+    """Lowercase text and collapse whitespace so formatting differences do not matter."""
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], "big")
+
+
+def simhash(text, shingle_size=SHINGLE_SIZE):
+    """Compute a 64-bit SimHash fingerprint of text from its word shingles."""
+    words = normalize_text(text).split(" ")
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        value = _hash64(shingle)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(first, second):
+    """Number of differing bits between two fingerprints."""
+    return bin(first ^ second).count("1")
+
+
+def _bands(fingerprint):
+    width = SIMHASH_BITS // SIMHASH_BANDS
+    mask = (1 << width) - 1
+    return [f"{band}:{fingerprint >> (band * width) & mask}" for band in range(SIMHASH_BANDS)]
+
+
+def chunk_fingerprint(chunk):
+    """Exact fingerprint of a chunk after whitespace and case normalization."""
+    return hashlib.sha1(normalize_text(chunk).encode('utf-8')).hexdigest()
+
+
+def register_page(url, cleaned_content):
+    """
+    Fingerprint a cleaned page and check it against previously seen pages.
+
+    Args:
+        url: The URL of the page
+        cleaned_content: The cleaned text of the page
+
+    Returns:
+        str: URL of a near-identical page seen before, or None
+    """
+    url = canonicalize_url(url)
+    fingerprint = simhash(cleaned_content)
+    bands = _bands(fingerprint)
+    duplicate_of = None
+
+    with _connect() as conn, _transaction(conn):
+        candidates = conn.execute(
+            "SELECT DISTINCT pages.url, pages.fingerprint FROM page_bands "
+            "JOIN pages ON pages.url = page_bands.url "
+            f"WHERE band IN ({', '.join('?' for _ in bands)}) AND pages.url != ? "
+            "ORDER BY pages.url",
+            (*bands, url)
+        ).fetchall()
+        for candidate, candidate_fingerprint in candidates:
+            distance = hamming_distance(fingerprint, int(candidate_fingerprint, 16))
+            if distance <= NEAR_DUPLICATE_DISTANCE:
+                duplicate_of = candidate
+                break
+
+        conn.execute("DELETE FROM page_bands WHERE url = ?", (url,))
+        conn.executemany(
+            "INSERT INTO page_bands (band, url) VALUES (?, ?)", [(band, url) for band in bands]
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO pages (url, fingerprint) VALUES (?, ?)",
+            (url, format(fingerprint, "016x"))
+        )
+        _increment(conn, 'pages_seen', 1)
+        if duplicate_of:
+            _increment(conn, 'near_duplicate_pages', 1)
+
+    if duplicate_of:
+        print(f"{url} is a near-duplicate of {duplicate_of}")
+    return duplicate_of
+
+
+def _chunk_result_key(chunk, parse_description):
+    return f"{chunk_fingerprint(chunk)}:{chunk_fingerprint(parse_description)}"
+
+
+def get_chunk_results(chunks, parse_description):
+    """
+    Look up prior LLM results for a batch of chunks and update the dedup statistics.
+
+    A chunk repeated within the batch counts as deduplicated, but its result is
+    only known once the first occurrence has been parsed.
+
+    Returns:
+        list: the stored result for each chunk, or None where the chunk must be parsed
+    """
+    keys = [_chunk_result_key(chunk, parse_description) for chunk in chunks]
+    unique_keys = list(dict.fromkeys(keys))
+    stored = {}
+
+    with _connect() as conn:
+        for i in range(0, len(unique_keys), LOOKUP_BATCH_SIZE):
+            batch = unique_keys[i:i + LOOKUP_BATCH_SIZE]
+            rows = conn.execute(
+                "SELECT key, result FROM chunk_results "
+                f"WHERE key IN ({', '.join('?' for _ in batch)}) AND expiry >= ?",
+                (*batch, time.time())
+            ).fetchall()
+            stored.update(rows)
+
+        with _transaction(conn):
+            _increment(conn, 'chunks_seen', len(keys))
+            _increment(conn, 'chunks_deduplicated', len(keys) - len(unique_keys) + len(stored))
+
+    return [stored.get(key) for key in keys]
+
+
+def save_chunk_results(chunks, parse_description, results, expiry_hours=24):
+    """Store LLM results for chunks so identical chunks can reuse them, dropping expired ones."""
+    now = time.time()
+    expiry = now + expiry_hours * 3600
+    with _connect() as conn, _transaction(conn):
+        conn.execute("DELETE FROM chunk_results WHERE expiry < ?", (now,))
+        conn.executemany(
+            "INSERT OR REPLACE INTO chunk_results (key, result, expiry) VALUES (?, ?, ?)",
+            [(_chunk_result_key(chunk, parse_description), result, expiry)
+             for chunk, result in zip(chunks, results)]
+        )
+
+
+def get_dedup_stats():
+    """
+    Get deduplication statistics since the last reset.
+
+    Returns:
+        dict: page and chunk counters plus 'chunk_dedup_ratio', the fraction of
+              chunks that reused a prior LLM result
+    """
+    with _connect() as conn:
+        stats = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+    for name in STAT_COUNTERS:
+        stats.setdefault(name, 0)
+    stats['chunk_dedup_ratio'] = (
+        stats['chunks_deduplicated'] / stats['chunks_seen'] if stats['chunks_seen'] else 0.0
+    )
+    return stats
+
+
+def reset_dedup_stats():
+    """Reset the statistics, e.g. at the start of a new crawl."""
+    with _connect() as conn, _transaction(conn):
+        conn.execute("DELETE FROM stats")
+        conn.execute(
+            "INSERT INTO stats (name, value) VALUES ('started', ?)", (datetime.now().isoformat(),)
+        )
@@ -0,0 +1,186 @@
+"""Module for learning per-domain fetch policies (captcha handling and page readiness)."""
+
+import os
+import json
+import pickle
+from datetime import datetime
+
+from cache_manager import (
+    CACHE_DIR, ensure_cache_dir, get_cache_path, get_domain, file_lock, write_atomic
+)
+
+POLICY_PATH = os.path.join(CACHE_DIR, "fetch_policy.json")
+
+# Captcha statuses reported by Scraping Browser that mean no captcha was on the page
+NO_CAPTCHA_STATUSES = ("not_detected", "skipped")
+
+# Number of fetches per domain that always check for a captcha before the policy is trusted
+PROBE_FETCHES = 3
+
+# Once a domain is considered captcha-free, still check every Nth fetch in case that changes
+REPROBE_INTERVAL = 20
+
+# Number of recent captcha statuses kept per domain
+HISTORY_SIZE = 20
+
+DEFAULT_DETECT_TIMEOUT_MS = 10000
+
+# Bounds for the readiness wait, tuned from the observed time pages take to become ready.
+# Domains with a ready selector or network idle check always get the full wait, since a
+# timeout there means reading a half-loaded page.
+MIN_READY_TIMEOUT = 2.0
+MAX_READY_TIMEOUT = 30.0
+READY_TIMEOUT_FACTOR = 3.0
+
+# Weight of the newest sample in the moving averages
+EMA_ALPHA = 0.3
+
+# Markers in page source that indicate a full-page challenge slipped through without a
+# captcha wait. Embedded widgets such as reCAPTCHA or hCaptcha on login and contact forms
+# are not listed, since they appear on ordinary pages.
+CAPTCHA_MARKERS = ("cf-challenge", "challenge-form", "captcha-delivery", "px-captcha")
+
+
+def load_policies():
+    """Load stored per-domain statistics, seeding them from the cache on first use.
+    Callers that modify and save the statistics must hold file_lock(POLICY_PATH)."""
+    if not os.path.exists(POLICY_PATH):
+        policies = bootstrap_from_cache()
+        save_policies(policies)
+        return policies
+    try:
+        with open(POLICY_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return {}
+
+
+def save_policies(policies):
+    """Write per-domain statistics to disk."""
+    ensure_cache_dir()
+    write_atomic(POLICY_PATH, json.dumps(policies, indent=2))
+
+
+def _new_stats():
+    return {
+        'fetches': 0,
+        'captcha_seen': 0,
+        'recent_statuses': [],
+        'avg_scrape_time': None,
+        'avg_ready_time': None,
+        'ready_selector': None,
+        'network_idle': False,
+        'updated': None
+    }
+
+
+def _update_stats(stats, captcha_status, scrape_time=None, ready_time=None):
+    stats['fetches'] += 1
+    if captcha_status not in NO_CAPTCHA_STATUSES:
+        stats['captcha_seen'] += 1
+    if captcha_status != "skipped":
+        stats['recent_statuses'] = (stats['recent_statuses'] + [captcha_status])[-HISTORY_SIZE:]
+    for key, value in (('avg_scrape_time', scrape_time), ('avg_ready_time', ready_time)):
+        if value is not None:
+            previous = stats.get(key)
+            stats[key] = value if previous is None else (
+                EMA_ALPHA * value + (1 - EMA_ALPHA) * previous
+            )
+    stats['updated'] = datetime.now().isoformat()
+
+
+def bootstrap_from_cache():
+    """Build initial per-domain statistics from captcha_status and timing stored in the cache."""
+    policies = {}
+    index_path = os.path.join(CACHE_DIR, "index.json")
+    if not os.path.exists(index_path):
+        return policies
+
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index_data = json.load(f)
+    except json.JSONDecodeError:
+        return policies
+
+    for cache_key, info in index_data.items():
+        cache_path = get_cache_path(cache_key)
+        if not os.path.exists(cache_path):
+            continue
+        try:
+            with open(cache_path, 'rb') as f:
+                metadata = pickle.load(f).get('metadata', {})
+        except (pickle.UnpicklingError, EOFError, KeyError, AttributeError):
+            continue
+        if 'captcha_status' not in metadata:
+            continue
+        stats = policies.setdefault(get_domain(info['url']), _new_stats())
+        _update_stats(stats, metadata['captcha_status'], metadata.get('scrape_time_seconds'))
+
+    return policies
+
+
+def set_readiness(url, ready_selector=None, network_idle=False):
+    """
+    Configure how to tell that pages of a domain are ready to be read.
+
+    Args:
+        url: Any URL of the domain
+        ready_selector: CSS selector that must be present before reading the page
+        network_idle: Wait until no new network requests are made before reading the page
+    """
+    with file_lock(POLICY_PATH):
+        policies = load_policies()
+        stats = policies.setdefault(get_domain(url), _new_stats())
+        stats['ready_selector'] = ready_selector
+        stats['network_idle'] = network_idle
+        # Ready times measured under the previous conditions no longer apply
+        stats['avg_ready_time'] = None
+        save_policies(policies)
+
+
+def get_fetch_policy(url):
+    """
+    Decide how to fetch a URL based on what was learned about its domain.
+
+    Returns:
+        dict: 'check_captcha', 'detect_timeout_ms', 'ready_selector', 'network_idle'
+              and 'ready_timeout' (seconds)
+    """
+    with file_lock(POLICY_PATH):
+        stats = load_policies().get(get_domain(url)) or _new_stats()
+
+    recent = stats['recent_statuses']
+    captcha_free = (
+        len(recent) >= PROBE_FETCHES
+        and all(status in NO_CAPTCHA_STATUSES for status in recent[-PROBE_FETCHES:])
+    )
+    check_captcha = not captcha_free or stats['fetches'] % REPROBE_INTERVAL == 0
+
+    ready_timeout = MAX_READY_TIMEOUT
+    has_conditions = stats.get('ready_selector') or stats.get('network_idle')
+    if not has_conditions and stats.get('avg_ready_time') is not None:
+        ready_timeout = min(MAX_READY_TIMEOUT,
+                            max(MIN_READY_TIMEOUT, READY_TIMEOUT_FACTOR * stats['avg_ready_time']))
+
+    return {
+        'check_captcha': check_captcha,
+        'detect_timeout_ms': DEFAULT_DETECT_TIMEOUT_MS,
+        'ready_selector': stats.get('ready_selector'),
+        'network_idle': stats.get('network_idle', False),
+        'ready_timeout': ready_timeout
+    }
+
+
+def record_fetch_outcome(url, captcha_status, scrape_time=None, ready_time=None):
+    """Record the result of a fetch so the domain policy tunes itself."""
+    with file_lock(POLICY_PATH):
+        policies = load_policies()
+        stats = policies.setdefault(get_domain(url), _new_stats())
+        _update_stats(stats, captcha_status, scrape_time, ready_time)
+        save_policies(policies)
+
+
+def looks_like_captcha(html):
+    """Check page source for markers of a full-page captcha challenge."""
+    lowered = html.lower()
+    return any(marker in lowered for marker in CAPTCHA_MARKERS)
@@ -0,0 +1,282 @@
+"""Module for a persistent job queue shared by the Streamlit app and worker processes."""
+
+import os
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+from cache_manager import CACHE_DIR
+
+load_dotenv()
+
+# Must be on a local disk: the SQLite backend only supports workers on one host
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', os.path.join(CACHE_DIR, "jobs.sqlite3"))
+
+DEFAULT_LEASE_SECONDS = 300
+
+# SQLite limits the number of parameters in one statement
+LOOKUP_BATCH_SIZE = 500
+DEFAULT_MAX_ATTEMPTS = 3
+
+# A worker not seen for this long is considered gone. Busy workers check in
+# when they renew their lease, every third of DEFAULT_LEASE_SECONDS.
+WORKER_TIMEOUT_SECONDS = DEFAULT_LEASE_SECONDS / 2
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status, kind, priority, id);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL
+);
+"""
+
+
+class JobQueue:
+    """
+    Job queue backed by SQLite.
+
+    Jobs are leased by workers for a limited time, acknowledged on completion and
+    handed out again if the lease expires before the worker acknowledges them.
+    The database uses WAL mode, so all workers must run on the same host as the
+    app; spreading workers over several machines needs a networked backend
+    providing the same methods.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or JOB_QUEUE_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, kind, payload, priority=0, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Add a job to the queue.
+
+        Args:
+            kind: Job type, used by workers to pick a handler
+            payload: JSON-serializable job arguments
+            priority: Lower values are leased first
+            max_attempts: Number of leases before the job is marked failed
+
+        Returns:
+            int: the job ID
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (kind, payload, status, priority, max_attempts, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload), QUEUED, priority, max_attempts, now, now)
+            )
+            return cursor.lastrowid
+
+    @staticmethod
+    def _heartbeat(conn, worker_id, now):
+        conn.execute(
+            "INSERT OR REPLACE INTO workers (worker_id, last_seen) VALUES (?, ?)", (worker_id, now)
+        )
+
+    def _requeue_expired(self, conn, now):
+        conn.execute(
+            "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, updated = ? "
+            "WHERE status = ? AND lease_expires < ? AND attempts < max_attempts",
+            (QUEUED, now, LEASED, now)
+        )
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = 'lease expired', lease_owner = NULL, updated = ? "
+            "WHERE status = ? AND lease_expires < ? AND attempts >= max_attempts",
+            (FAILED, now, LEASED, now)
+        )
+
+    def lease(self, worker_id, kinds=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Lease the next queued job, reclaiming jobs whose lease has expired.
+
+        Returns:
+            dict: the job with decoded payload, or None if no job is available
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._heartbeat(conn, worker_id, now)
+                self._requeue_expired(conn, now)
+
+                query = "SELECT * FROM jobs WHERE status = ?"
+                params = [QUEUED]
+                if kinds:
+                    query += f" AND kind IN ({', '.join('?' for _ in kinds)})"
+                    params.extend(kinds)
+                row = conn.execute(query + " ORDER BY priority, id LIMIT 1", params).fetchone()
+
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, "
+                        "lease_expires = ?, updated = ? WHERE id = ?",
+                        (LEASED, worker_id, now + lease_seconds, now, row['id'])
+                    )
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return None
+        job = self._row_to_dict(row)
+        job.update(status=LEASED, attempts=row['attempts'] + 1, lease_owner=worker_id,
+                   lease_expires=now + lease_seconds)
+        return job
+
+    def extend_lease(self, job_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extend a lease still held by the worker. Returns False if the lease was lost."""
+        now = time.time()
+        with self._connect() as conn:
+            self._heartbeat(conn, worker_id, now)
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated = ? "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (now + lease_seconds, now, job_id, LEASED, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def ack(self, job_id, worker_id, result=None):
+        """Mark a leased job as done. Returns False if the lease was lost."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, lease_owner = NULL, "
+                "lease_expires = NULL, updated = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+                (DONE, json.dumps(result), time.time(), job_id, LEASED, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id, worker_id, error):
+        """Release a job after an error, requeueing it unless it is out of attempts."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN ? ELSE ? END, "
+                "error = ?, lease_owner = NULL, lease_expires = NULL, updated = ? "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (QUEUED, FAILED, str(error), time.time(), job_id, LEASED, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def cancel(self, job_ids, reason="cancelled"):
+        """Mark unfinished jobs as failed so no worker runs them. Returns the number cancelled."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL, "
+                f"updated = ? WHERE id IN ({', '.join('?' for _ in job_ids)}) "
+                "AND status IN (?, ?)",
+                (FAILED, reason, time.time(), *job_ids, QUEUED, LEASED)
+            )
+            return cursor.rowcount
+
+    def live_workers(self, within=WORKER_TIMEOUT_SECONDS):
+        """Number of workers that leased a job, polled or renewed a lease recently."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM workers WHERE last_seen >= ?", (time.time() - within,)
+            ).fetchone()
+        return row[0]
+
+    def get_job(self, job_id):
+        """Get a job by ID, or None if it does not exist."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def get_jobs(self, job_ids):
+        """Get several jobs with one query per batch, in the order of job_ids (None if missing)."""
+        jobs = {}
+        with self._connect() as conn:
+            for i in range(0, len(job_ids), LOOKUP_BATCH_SIZE):
+                batch = job_ids[i:i + LOOKUP_BATCH_SIZE]
+                rows = conn.execute(
+                    f"SELECT * FROM jobs WHERE id IN ({', '.join('?' for _ in batch)})", batch
+                ).fetchall()
+                jobs.update((row['id'], self._row_to_dict(row)) for row in rows)
+        return [jobs.get(job_id) for job_id in job_ids]
+
+    def wait_for_jobs(self, job_ids, poll_interval=1.0, timeout=None):
+        """
+        Poll until all jobs are done or failed.
+
+        Returns:
+            list: the final job dictionaries, in the order of job_ids
+
+        Raises:
+            TimeoutError: if the jobs are not finished within timeout seconds
+        """
+        deadline = time.time() + timeout if timeout else None
+        while True:
+            jobs = self.get_jobs(job_ids)
+            if all(job and job['status'] in (DONE, FAILED) for job in jobs):
+                return jobs
+            if deadline and time.time() > deadline:
+                raise TimeoutError(f"Jobs not finished after {timeout} seconds")
+            time.sleep(poll_interval)
+
+    def run_job(self, kind, payload, timeout=None, poll_interval=1.0):
+        """
+        Enqueue a job and wait for its result.
+
+        Raises:
+            TimeoutError: if the job is not finished within timeout seconds, in which
+                case it is cancelled so no worker runs it later for nobody
+            RuntimeError: if the job failed
+        """
+        job_id = self.enqueue(kind, payload)
+        try:
+            job = self.wait_for_jobs([job_id], poll_interval, timeout)[0]
+        except TimeoutError:
+            self.cancel([job_id], "timed out")
+            raise
+        if job['status'] != DONE:
+            raise RuntimeError(f"{kind} job {job_id} failed: {job['error']}")
+        return job['result']
+
+    def counts(self):
+        """Number of jobs per status."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    @staticmethod
+    def _row_to_dict(row):
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
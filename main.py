@@ -8,9 +8,13 @@ import streamlit as st
 
 from scrape import scrape_website, extract_body_content, clean_body_content, split_dom_content
 from parse import parse_with_ollama
+from crawler import crawl, queue_fetcher
+from fetch_policy import get_fetch_policy, set_readiness
+from dedup import get_dedup_stats, reset_dedup_stats
+from job_queue import JobQueue, DONE
 from cache_manager import CACHE_DIR, clean_expired_cache
 
-from cache_manager import generate_cache_key, get_cache_path
+from cache_manager import generate_cache_key, get_cache_path, get_domain
 
 from gsheets_storage import get_parsed_results, save_parsed_result, search_parsed_results
 
@@ -74,6 +78,39 @@ with st.sidebar:
     else:
         st.info("No cache directory exists yet")
 
+    # Crawl settings
+    st.header("Crawl Settings")
+
+    crawl_mode = st.checkbox("Crawl Linked Pages", value=False,
+                             help="Follow links from the URL and scrape every page found")
+    if crawl_mode:
+        crawl_max_pages = st.slider("Max Pages", min_value=1, max_value=200, value=20)
+        crawl_max_depth = st.slider("Max Link Depth", min_value=0, max_value=5, value=1)
+        crawl_delay = st.slider("Delay Per Domain (seconds)", min_value=0.0, max_value=10.0,
+                                value=1.0, step=0.5,
+                                help="Minimum time between two requests to the same site")
+        crawl_same_domain = st.checkbox("Stay on Same Domain", value=True)
+        crawl_resume = st.checkbox("Resume Previous Crawl", value=False,
+                                   help="Persist the crawl frontier so an interrupted crawl "
+                                        "continues where it stopped")
+
+    # Worker queue settings
+    st.header("Worker Settings")
+
+    use_queue = st.checkbox("Use Worker Queue", value=False,
+                            help="Send scrape and parse jobs to worker processes "
+                                 "started with `python worker.py`")
+    if use_queue:
+        job_timeout = st.slider("Job Timeout (seconds)", min_value=30, max_value=1800, value=600)
+        queue_counts = JobQueue().counts()
+        st.caption(", ".join(f"{status}: {count}" for status, count in queue_counts.items())
+                   or "Queue is empty")
+        LIVE_WORKERS = JobQueue().live_workers()
+        if LIVE_WORKERS:
+            st.caption(f"Live workers: {LIVE_WORKERS}")
+        else:
+            st.warning("No live workers. Start them with `python worker.py`")
+
 if st.sidebar.checkbox("Show Google Sheet Information"):
     spreadsheet_id = os.getenv('SPREADSHEET_ID')
     if spreadsheet_id:
@@ -86,6 +123,23 @@ if st.sidebar.checkbox("Show Google Sheet Information"):
 # Main content area
 url = st.text_input("Enter the URL of the website you want to scrape:")
 
+# Readiness conditions are stored per domain and used by every scrape of that domain
+if url and get_domain(url):
+    with st.sidebar:
+        st.header("Page Readiness")
+        fetch_policy = get_fetch_policy(url)
+        ready_selector = st.text_input(
+            "Wait for CSS Selector", value=fetch_policy['ready_selector'] or "",
+            help="Read the page only once an element matching this selector is present"
+        )
+        network_idle = st.checkbox(
+            "Wait for Network Idle", value=fetch_policy['network_idle'],
+            help="Read the page only once it stops loading new resources"
+        )
+        if st.button(f"Save for {get_domain(url)}"):
+            set_readiness(url, ready_selector.strip() or None, network_idle)
+            st.success("Readiness conditions saved")
+
 # Cache status indicator
 if url and st.session_state.use_cache:
     
@@ -112,17 +166,86 @@ with col2:
 if scrape_button:
     if url:
         with st.spinner("Scraping the website..."):
-            # Scrape the website with cache settings from session state
-            dom_content = scrape_website(
-                url, 
-                use_cache=st.session_state.use_cache,
-                cache_expiry_hours=st.session_state.cache_expiry
-            )
-            BODY_CONTENT = extract_body_content(dom_content)
-            CLEANED_CONTENT = clean_body_content(BODY_CONTENT)
+            # Deduplication statistics are reported per scrape or crawl
+            reset_dedup_stats()
+
+            if crawl_mode:
+                FETCH_PAGE = None
+                CRAWL_WORKERS = 4
+                if use_queue:
+                    # The crawl is scheduled here, each page is scraped by a worker
+                    job_queue = JobQueue()
+                    CRAWL_WORKERS = job_queue.live_workers()
+                    if not CRAWL_WORKERS:
+                        st.error("No worker is running. Start one with `python worker.py` "
+                                 "or disable the worker queue.")
+                        st.stop()
+                    FETCH_PAGE = queue_fetcher(
+                        job_queue,
+                        use_cache=st.session_state.use_cache,
+                        cache_expiry_hours=st.session_state.cache_expiry,
+                        timeout=job_timeout
+                    )
+
+                # Crawl the website starting from the URL
+                pages = crawl(
+                    [url],
+                    max_pages=crawl_max_pages,
+                    max_depth=crawl_max_depth,
+                    same_domain=crawl_same_domain,
+                    min_delay=crawl_delay,
+                    crawl_name=generate_cache_key(url) if crawl_resume else None,
+                    max_workers=CRAWL_WORKERS,
+                    use_cache=st.session_state.use_cache,
+                    cache_expiry_hours=st.session_state.cache_expiry,
+                    fetch_page=FETCH_PAGE
+                )
+                PAGE_CONTENTS = [
+                    clean_body_content(extract_body_content(page['html'])) for page in pages
+                ]
+                CLEANED_CONTENT = "\n\n".join(PAGE_CONTENTS)
+                NEAR_DUPLICATES = sum(1 for page in pages if page['near_duplicate_of'])
+                st.info(f"Crawled {len(pages)} pages ({NEAR_DUPLICATES} near-duplicates)")
+            elif use_queue:
+                # Submit the scrape to the workers and wait for the result
+                job_queue = JobQueue()
+                if not job_queue.live_workers():
+                    st.error("No worker is running. Start one with `python worker.py` "
+                             "or disable the worker queue.")
+                    st.stop()
+                job_id = job_queue.enqueue('scrape', {
+                    'url': url,
+                    'use_cache': st.session_state.use_cache,
+                    'cache_expiry_hours': st.session_state.cache_expiry
+                })
+                try:
+                    job = job_queue.wait_for_jobs([job_id], timeout=job_timeout)[0]
+                except TimeoutError:
+                    # Cancelled so a worker does not scrape it later for nobody
+                    job_queue.cancel([job_id], "timed out")
+                    st.error(f"Scrape job did not finish within {job_timeout} seconds "
+                             "and was cancelled")
+                    st.stop()
+                if job['status'] != DONE:
+                    st.error(f"Scrape job failed: {job['error']}")
+                    st.stop()
+                CLEANED_CONTENT = job['result']['content']
+                PAGE_CONTENTS = [CLEANED_CONTENT]
+            else:
+                # Scrape the website with cache settings from session state
+                dom_content = scrape_website(
+                    url, 
+                    use_cache=st.session_state.use_cache,
+                    cache_expiry_hours=st.session_state.cache_expiry
+                )
+                BODY_CONTENT = extract_body_content(dom_content)
+                CLEANED_CONTENT = clean_body_content(BODY_CONTENT)
+                PAGE_CONTENTS = [CLEANED_CONTENT]
 
             # Store the DOM content in Streamlit session state
             st.session_state.dom_content = CLEANED_CONTENT
+            # Pages are chunked separately so identical pages produce identical chunks
+            st.session_state.dom_pages = PAGE_CONTENTS
             st.session_state.current_url = url
 
             # Display the DOM content in an expandable text box
@@ -142,14 +265,51 @@ if "dom_content" in st.session_state:
     if st.button("Parse Content"):
         if parse_description:
             with st.spinner("Parsing the content..."):
-                dom_chunks = split_dom_content(st.session_state.dom_content)
-                PARSED_RESULT = parse_with_ollama(dom_chunks, parse_description)
+                dom_pages = st.session_state.get('dom_pages', [st.session_state.dom_content])
+                dom_chunks = [chunk for page in dom_pages for chunk in split_dom_content(page)]
+                if use_queue:
+                    # One job per chunk so several workers can parse in parallel
+                    job_queue = JobQueue()
+                    if not job_queue.live_workers():
+                        st.error("No worker is running. Start one with `python worker.py` "
+                                 "or disable the worker queue.")
+                        st.stop()
+                    job_ids = [
+                        job_queue.enqueue('parse', {
+                            'chunks': [chunk],
+                            'parse_description': parse_description,
+                            'cache_expiry_hours': st.session_state.cache_expiry
+                        })
+                        for chunk in dom_chunks
+                    ]
+                    try:
+                        jobs = job_queue.wait_for_jobs(job_ids, timeout=job_timeout)
+                    except TimeoutError:
+                        CANCELLED = job_queue.cancel(job_ids, "timed out")
+                        st.error(f"Parse jobs did not finish within {job_timeout} seconds, "
+                                 f"{CANCELLED} unfinished jobs were cancelled")
+                        st.stop()
+                    FAILED_JOBS = [job for job in jobs if job['status'] != DONE]
+                    if FAILED_JOBS:
+                        st.error(f"{len(FAILED_JOBS)} parse jobs failed: {FAILED_JOBS[0]['error']}")
+                        st.stop()
+                    PARSED_RESULT = "\n".join(job['result'] for job in jobs)
+                else:
+                    PARSED_RESULT = parse_with_ollama(
+                        dom_chunks, parse_description,
+                        cache_expiry_hours=st.session_state.cache_expiry
+                    )
+                DEDUP_STATS = get_dedup_stats()
                 
                 # Save the result
                 save_parsed_result(st.session_state.current_url, parse_description, PARSED_RESULT)
                 
                 st.subheader("Parsed Result")
                 st.write(PARSED_RESULT)
+                st.caption(
+                    f"{DEDUP_STATS['chunks_deduplicated']} of {DEDUP_STATS['chunks_seen']} chunks "
+                    f"reused prior results ({DEDUP_STATS['chunk_dedup_ratio']:.0%} deduplicated)"
+                )
                 st.success("Result parsed and saved successfully!")
         else:
             st.error("Please enter a description of what to parse")
@@ -3,6 +3,8 @@
 from langchain_ollama import OllamaLLM
 from langchain_core.prompts import ChatPromptTemplate
 
+from dedup import get_chunk_results, save_chunk_results
+
 TEMPLATE = (
     "You are tasked with extracting specific information from the following text content: {dom_content}. "
     "Please follow these instructions carefully: \n\n"
@@ -16,16 +18,32 @@ prompt = ChatPromptTemplate.from_template(TEMPLATE)
 
 model = OllamaLLM(model="llama3")
 
-def parse_with_ollama(dom_chunks, parse_description):
-    """Parse content using Ollama LLM to extract specific information based on description."""
+def parse_with_ollama(dom_chunks, parse_description, use_dedup=True, cache_expiry_hours=24):
+    """Parse content using Ollama LLM to extract specific information based on description.
+    When use_dedup is enabled, chunks already parsed with the same description reuse the prior
+    result, which is kept for cache_expiry_hours."""
     chain_prompt = ChatPromptTemplate.from_template(TEMPLATE)
     chain = chain_prompt | model
 
+    previous_results = (
+        get_chunk_results(dom_chunks, parse_description) if use_dedup else [None] * len(dom_chunks)
+    )
+    parsed_by_chunk = {}
     parsed_results = []
 
-    for chunk_index, chunk in enumerate(dom_chunks, start=1):
+    for chunk_index, (chunk, previous) in enumerate(zip(dom_chunks, previous_results), start=1):
+        if previous is None:
+            previous = parsed_by_chunk.get(chunk)
+        if use_dedup and previous is not None:
+            parsed_results.append(previous)
+            print(f"Reused result for batch {chunk_index} of {len(dom_chunks)}")
+            continue
+
         response = chain.invoke({"dom_content": chunk, "parse_description": parse_description})
         parsed_results.append(response)
+        parsed_by_chunk[chunk] = response
+        if use_dedup:
+            save_chunk_results([chunk], parse_description, [response], cache_expiry_hours)
         print(f"Parsed batch {chunk_index} of {len(dom_chunks)}")
 
     return "\n".join(parsed_results)
@@ -2,27 +2,97 @@
 
 import os
 import time
+import hashlib
 from datetime import datetime
+from urllib.parse import urljoin, urldefrag
 
 from selenium.webdriver import Remote, ChromeOptions
 from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 
 # Import the cache manager
 from cache_manager import load_from_cache, save_to_cache, clean_expired_cache
+from fetch_policy import get_fetch_policy, record_fetch_outcome, looks_like_captcha
 
 load_dotenv()
 
 AUTH = os.getenv('BRD_AUTH')
 SBR_WEBDRIVER = f'https://{AUTH}@brd.superproxy.io:9515'
 
-def scrape_website(website, use_cache=True, cache_expiry_hours=24):
+# How long the resource count must stay unchanged for the network to count as idle
+NETWORK_IDLE_SECONDS = 0.5
+
+NETWORK_IDLE_SCRIPT = "return performance.getEntriesByType('resource').length;"
+
+
+def wait_for_captcha(driver, detect_timeout_ms):
+    """Ask Scraping Browser to detect and solve a captcha, returning the solve status."""
+    print("Waiting captcha to solve...")
+    solve_res = driver.execute(
+        "executeCdpCommand",
+        {
+            "cmd": "Captcha.waitForSolve",
+            "params": {"detectTimeout": detect_timeout_ms},
+        },
+    )
+    status = solve_res["value"]["status"]
+    print("Captcha solve status:", status)
+    return status
+
+
+def wait_until_ready(driver, ready_selector=None, network_idle=False, timeout=30.0):
+    """
+    Wait until the page is ready to be read.
+
+    The document must be fully loaded, then optionally a CSS selector must be present
+    and/or the page must stop issuing network requests.
+
+    Returns:
+        tuple: (seconds spent waiting, whether the page became ready in time)
+    """
+    start_time = time.time()
+    ready = True
+    try:
+        WebDriverWait(driver, timeout).until(
+            lambda d: d.execute_script("return document.readyState") == "complete"
+        )
+        if ready_selector:
+            remaining = max(0.1, timeout - (time.time() - start_time))
+            WebDriverWait(driver, remaining).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, ready_selector))
+            )
+        if network_idle:
+            last_count, idle_since = None, time.time()
+            while time.time() - start_time < timeout:
+                count = driver.execute_script(NETWORK_IDLE_SCRIPT)
+                if count != last_count:
+                    last_count, idle_since = count, time.time()
+                elif time.time() - idle_since >= NETWORK_IDLE_SECONDS:
+                    break
+                time.sleep(0.1)
+            else:
+                ready = False
+    except TimeoutException:
+        ready = False
+    if not ready:
+        print(f"Page not ready after {timeout:.1f} seconds, reading it anyway")
+    return time.time() - start_time, ready
+
+
+def scrape_website(website, use_cache=True, cache_expiry_hours=24, clean_cache=True):
     """Scrape website content using Selenium with Bright Data proxy, 
-    handling captcha automatically. Uses cache when available and requested."""
+    handling captcha automatically. Uses cache when available and requested.
+    The captcha wait and readiness conditions follow the learned per-domain fetch policy.
+    Callers scraping many pages can pass clean_cache=False and clean the cache once themselves."""
     
     # Clean expired cache entries at the start
-    clean_expired_cache()
+    if clean_cache:
+        clean_expired_cache()
     
     # Check cache first if enabled
     if use_cache:
@@ -35,27 +105,41 @@ def scrape_website(website, use_cache=True, cache_expiry_hours=24):
     print("Connecting to Scraping Browser...")
     start_time = time.time()
     
+    policy = get_fetch_policy(website)
+
     sbr_connection = ChromiumRemoteConnection(SBR_WEBDRIVER, "goog", "chrome")
     with Remote(sbr_connection, options=ChromeOptions()) as driver:
         driver.get(website)
-        print("Waiting captcha to solve...")
-        solve_res = driver.execute(
-            "executeCdpCommand",
-            {
-                "cmd": "Captcha.waitForSolve",
-                "params": {"detectTimeout": 10000},
-            },
+        captcha_status = "skipped"
+        if policy['check_captcha']:
+            captcha_status = wait_for_captcha(driver, policy['detect_timeout_ms'])
+        ready_time, ready = wait_until_ready(
+            driver, policy['ready_selector'], policy['network_idle'], policy['ready_timeout']
         )
-        print("Captcha solve status:", solve_res["value"]["status"])
-        print("Navigated! Scraping page content...")
         html = driver.page_source
+
+        # The domain was believed captcha-free but served a challenge
+        if captcha_status == "skipped" and looks_like_captcha(html):
+            captcha_status = wait_for_captcha(driver, policy['detect_timeout_ms'])
+            extra_time, ready = wait_until_ready(
+                driver, policy['ready_selector'], policy['network_idle'], policy['ready_timeout']
+            )
+            ready_time += extra_time
+            html = driver.page_source
+
+        print("Navigated! Scraping page content...")
+        scrape_time = time.time() - start_time
+        record_fetch_outcome(website, captcha_status, scrape_time, ready_time)
         
-        # Save to cache if enabled
-        if use_cache:
+        # Save to cache if enabled, but never keep a half-loaded page
+        if use_cache and not ready:
+            print("Not caching the page since it did not become ready")
+        elif use_cache:
             metadata = {
                 'timestamp': datetime.now().isoformat(),
-                'scrape_time_seconds': time.time() - start_time,
-                'captcha_status': solve_res["value"]["status"]
+                'scrape_time_seconds': scrape_time,
+                'captcha_status': captcha_status,
+                'ready_time_seconds': ready_time
             }
             save_to_cache(website, html, metadata, cache_expiry_hours)
             print(f"Saved to cache. Scrape time: {metadata['scrape_time_seconds']:.2f} seconds")
@@ -72,6 +156,18 @@ def extract_body_content(html_content):
     return ""
 
 
+def extract_links(soup, base_url):
+    """Extract absolute http(s) link URLs from an already-parsed BeautifulSoup document."""
+    links = []
+    for anchor in soup.find_all("a", href=True):
+        if "nofollow" in (anchor.get("rel") or []):
+            continue
+        link, _ = urldefrag(urljoin(base_url, anchor["href"].strip()))
+        if link.startswith(("http://", "https://")):
+            links.append(link)
+    return links
+
+
 def clean_body_content(body_content):
     """Clean HTML body content by removing scripts, styles and formatting text."""
     soup = BeautifulSoup(body_content, "html.parser")
@@ -88,8 +184,45 @@ def clean_body_content(body_content):
     return cleaned_content
 
 
-def split_dom_content(dom_content, max_length=6000):
-    """Split DOM content into chunks of specified maximum length."""
-    return [
-        dom_content[i : i + max_length] for i in range(0, len(dom_content), max_length)
-    ]
+def split_dom_content(dom_content, target_length=6000, max_length=None):
+    """
+    Split DOM content into chunks averaging about target_length characters.
+
+    Chunks end on line boundaries chosen from the content of the lines themselves,
+    so text shared between two pages is cut at the same places and gives identical
+    chunks, even if something was inserted earlier on one of the pages. The price
+    is uneven chunk sizes: a chunk can grow up to max_length (twice target_length
+    by default) before it is cut regardless of content. In exchange the number of
+    chunks, and so of LLM calls, stays close to fixed target_length chunks.
+    """
+    max_length = max_length or 2 * target_length
+    min_length = target_length // 4
+    chunks = []
+    current = []
+    current_length = 0
+
+    for line in dom_content.split("\n"):
+        # Lines longer than a chunk are cut into pieces of max_length
+        while len(line) > max_length:
+            if current:
+                chunks.append("\n".join(current))
+                current, current_length = [], 0
+            chunks.append(line[:max_length])
+            line = line[max_length:]
+
+        if current and current_length + 1 + len(line) > max_length:
+            chunks.append("\n".join(current))
+            current, current_length = [], 0
+
+        current.append(line)
+        current_length += len(line) + (1 if current_length else 0)
+
+        # A line ends a chunk with probability proportional to its length
+        line_hash = int.from_bytes(hashlib.md5(line.encode('utf-8')).digest()[:4], "big")
+        if current_length >= min_length and line_hash % max(1, target_length) < len(line):
+            chunks.append("\n".join(current))
+            current, current_length = [], 0
+
+    if current:
+        chunks.append("\n".join(current))
+    return [chunk for chunk in chunks if chunk]
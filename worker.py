@@ -0,0 +1,224 @@
+"""Worker processes that lease scrape and parse jobs from the job queue and run them.
+
+Run `python worker.py --processes 4` on the host running the app, or
+`python worker.py --benchmark` to measure how throughput scales with the
+number of worker processes.
+"""
+
+import os
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+from job_queue import JobQueue, DEFAULT_LEASE_SECONDS, DONE
+
+# Seconds to wait before polling again when the queue is empty
+IDLE_POLL_SECONDS = 1.0
+
+
+def handle_scrape(payload):
+    """Scrape a URL and return its cleaned content, plus the raw HTML if include_html is set."""
+    # Imported here so workers only load the dependencies of the jobs they run
+    from scrape import scrape_website, extract_body_content, clean_body_content
+
+    html = scrape_website(
+        payload['url'],
+        use_cache=payload.get('use_cache', True),
+        cache_expiry_hours=payload.get('cache_expiry_hours', 24),
+        clean_cache=payload.get('clean_cache', True)
+    )
+    result = {'url': payload['url'], 'content': clean_body_content(extract_body_content(html))}
+    if payload.get('include_html'):
+        result['html'] = html
+    return result
+
+
+def handle_parse(payload):
+    """Parse chunks of content with the LLM."""
+    from parse import parse_with_ollama
+
+    return parse_with_ollama(
+        payload['chunks'], payload['parse_description'],
+        cache_expiry_hours=payload.get('cache_expiry_hours', 24)
+    )
+
+
+HANDLERS = {
+    'scrape': handle_scrape,
+    'parse': handle_parse
+}
+
+
+def _benchmark_sleep(payload):
+    """Sleep for a fixed time, used to benchmark the queue without scraping."""
+    time.sleep(payload['seconds'])
+    return payload['seconds']
+
+
+BENCHMARK_HANDLERS = {'sleep': _benchmark_sleep}
+
+
+def _keep_lease(queue, job_id, worker_id, lease_seconds, stop_event):
+    """Extend the lease periodically while the job is running."""
+    while not stop_event.wait(lease_seconds / 3):
+        if not queue.extend_lease(job_id, worker_id, lease_seconds):
+            return
+
+
+def run_worker(queue_path=None, kinds=None, lease_seconds=DEFAULT_LEASE_SECONDS,
+               exit_when_empty=False, handlers=None):
+    """
+    Lease and run jobs until stopped.
+
+    Args:
+        queue_path: Path of the queue database, defaults to JOB_QUEUE_PATH
+        kinds: Job kinds to run, defaults to every kind in handlers
+        lease_seconds: Lease duration, renewed while a job is running
+        exit_when_empty: Return once no job is available instead of polling
+        handlers: Mapping of job kind to handler, defaults to HANDLERS
+
+    Returns:
+        int: number of jobs processed
+    """
+    queue = JobQueue(queue_path)
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    handlers = handlers or HANDLERS
+    kinds = kinds or list(handlers)
+    processed = 0
+
+    while True:
+        job = queue.lease(worker_id, kinds, lease_seconds)
+        if job is None:
+            if exit_when_empty:
+                return processed
+            time.sleep(IDLE_POLL_SECONDS)
+            continue
+
+        stop_event = threading.Event()
+        heartbeat = threading.Thread(
+            target=_keep_lease,
+            args=(queue, job['id'], worker_id, lease_seconds, stop_event),
+            daemon=True
+        )
+        heartbeat.start()
+        try:
+            result = handlers[job['kind']](job['payload'])
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"Job {job['id']} ({job['kind']}) failed: {e}")
+            queue.fail(job['id'], worker_id, e)
+        else:
+            if not queue.ack(job['id'], worker_id, result):
+                print(f"Lease lost for job {job['id']}, result discarded")
+        finally:
+            stop_event.set()
+            heartbeat.join()
+        processed += 1
+
+
+def run_workers(processes, queue_path=None, kinds=None, exit_when_empty=False, handlers=None):
+    """Run several worker processes and wait for them to finish."""
+    workers = [
+        multiprocessing.Process(
+            target=run_worker,
+            kwargs={'queue_path': queue_path, 'kinds': kinds,
+                    'exit_when_empty': exit_when_empty, 'handlers': handlers}
+        )
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def check_lease_expiry(queue_path):
+    """
+    Check that a job whose worker vanished is leased again and done exactly once.
+
+    Raises:
+        RuntimeError: if the expired lease is not handed out again or a late ack is accepted
+    """
+    queue = JobQueue(queue_path)
+    job_id = queue.enqueue('sleep', {'seconds': 0})
+    if queue.lease("vanished-worker", ['sleep'], lease_seconds=0.1)['id'] != job_id:
+        raise RuntimeError("Leased a different job than the one enqueued")
+    time.sleep(0.2)
+
+    run_workers(1, queue_path, ['sleep'], exit_when_empty=True, handlers=BENCHMARK_HANDLERS)
+
+    job = queue.get_job(job_id)
+    if job['status'] != DONE or job['attempts'] != 2:
+        raise RuntimeError(f"Job with an expired lease was not run again exactly once: {job}")
+    if queue.ack(job_id, "vanished-worker", 0):
+        raise RuntimeError("Late ack of an expired lease was accepted")
+
+
+def benchmark_scaling(process_counts=(1, 2, 4), jobs=200, job_seconds=0.02, min_efficiency=0.75):
+    """
+    Measure queue throughput for different numbers of worker processes.
+
+    Each run drains the same number of short fixed-duration jobs from a fresh queue,
+    so leasing contention on the queue shows up in the timings.
+
+    Raises:
+        RuntimeError: if a job is not done after exactly one lease, if an expired
+            lease is not handed out again, or if the speedup falls below
+            min_efficiency of linear scaling
+
+    Returns:
+        dict: process count -> jobs per second
+    """
+    throughput = {}
+    for processes in process_counts:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            queue_path = os.path.join(tmp_dir, "benchmark.sqlite3")
+            queue = JobQueue(queue_path)
+            job_ids = [queue.enqueue('sleep', {'seconds': job_seconds}) for _ in range(jobs)]
+
+            start_time = time.time()
+            run_workers(processes, queue_path, ['sleep'], exit_when_empty=True,
+                        handlers=BENCHMARK_HANDLERS)
+            elapsed = time.time() - start_time
+
+            finished = queue.wait_for_jobs(job_ids, timeout=5)
+            # Leased once and acknowledged once: no job was lost or run twice
+            if not all(job['status'] == DONE and job['attempts'] == 1 for job in finished):
+                raise RuntimeError(
+                    f"{sum(job['status'] != DONE for job in finished)} jobs not done, "
+                    f"{sum(job['attempts'] != 1 for job in finished)} leased more than once"
+                )
+            throughput[processes] = jobs / elapsed
+
+        ideal = processes / process_counts[0]
+        speedup = throughput[processes] / throughput[process_counts[0]]
+        print(f"{processes} worker(s): {throughput[processes]:.1f} jobs/s "
+              f"(speedup {speedup:.2f}x, ideal {ideal:.0f}x)")
+        if speedup < min_efficiency * ideal:
+            raise RuntimeError(
+                f"Speedup {speedup:.2f}x with {processes} workers is below "
+                f"{min_efficiency:.0%} of linear scaling"
+            )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        check_lease_expiry(os.path.join(tmp_dir, "lease.sqlite3"))
+    print("Expired lease was handed out again and completed once")
+    return throughput
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run AI Web Scraper queue workers")
+    parser.add_argument("--processes", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--kinds", nargs="+", choices=list(HANDLERS),
+                        help="Job kinds to run (default: all)")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Check throughput scaling with 1, 2 and 4 processes "
+                             "and lease expiry handling")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark_scaling()
+    else:
+        run_workers(args.processes, kinds=args.kinds)